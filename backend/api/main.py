@@ -4,17 +4,34 @@ FastAPI application for object detection using Qwen2.5-VL model.
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import tempfile
+import asyncio
+import functools
+import hashlib
+import logging
+import orjson
 import os
+import threading
+import time
+from cachetools import LRUCache
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-import io
 
-from object_detection.qwen import run_object_detection
-from object_detection.utils.image_to_base64 import (
-    ImageConversionRequest,
-    ImageConversionResponse,
+try:
+    from turbojpeg import TJPF_RGB, TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except Exception:  # PyTurboJPEG or the native libjpeg-turbo not installed
+    _turbo_jpeg = None
+
+from object_detection.qwen import (
+    DEFAULT_MAX_PIXELS,
+    DEFAULT_MODEL,
+    _get_model,
+    run_object_detection,
+    stream_object_detection,
 )
 
 
@@ -22,8 +39,9 @@ class ObjectDetectionRequest(BaseModel):
     """Request model for object detection."""
 
     prompt: str = "detect all the objects like sunglasses, shirts, trousers or watches in the image"
-    max_tokens: int = 1000
-    temperature: float = 0.7
+    max_tokens: int = 256
+    temperature: float = 0.1
+    max_pixels: int = DEFAULT_MAX_PIXELS
 
 
 class ObjectDetectionResponse(BaseModel):
@@ -35,10 +53,64 @@ class ObjectDetectionResponse(BaseModel):
     error_message: Optional[str] = None
 
 
+logger = logging.getLogger(__name__)
+
+# Requests are funneled here and drained by the background worker;
+# the task reference keeps the worker from being garbage collected
+_detection_queue: asyncio.Queue = asyncio.Queue()
+_batch_worker_task: Optional[asyncio.Task] = None
+
+# Completed responses keyed on image hash + generation parameters, so
+# duplicate uploads (retries, UI reloads) skip the model entirely
+_result_cache: LRUCache = LRUCache(maxsize=512)
+_result_cache_lock = threading.Lock()
+
+# Single worker thread so MLX only ever sees one caller on the Metal
+# device, while the event loop stays free to accept and decode uploads
+_model_executor = ThreadPoolExecutor(max_workers=1)
+
+
+async def _batch_worker():
+    """
+    Drain the detection queue one request at a time.
+
+    mlx_vlm has no batched generate, so requests can't share a prefill;
+    the queue still gives concurrent uploads a single ordered entry
+    point to the model worker thread while the event loop stays free.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        kwargs, future = await _detection_queue.get()
+        if future.done():
+            continue
+        try:
+            result = await loop.run_in_executor(
+                _model_executor,
+                functools.partial(run_object_detection, **kwargs),
+            )
+        except Exception as e:
+            # The waiter may have been cancelled (timeout, disconnect)
+            # while generation ran; setting a result then would raise
+            # InvalidStateError and kill the worker
+            if not future.done():
+                future.set_exception(e)
+            continue
+        if not future.done():
+            future.set_result(result)
+
+
+async def _submit_detection(**kwargs):
+    """Enqueue a detection request and await its result from the batch worker."""
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    await _detection_queue.put((kwargs, future))
+    return await future
+
+
 app = FastAPI(
     title="Object Detection API",
     description="API for object detection using Qwen2.5-VL model",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -51,12 +123,89 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def load_model():
+    """Load and warm up the model at startup, before the first request."""
+    _get_model(DEFAULT_MODEL)
+
+    # MLX compiles Metal kernels lazily on first use; a tiny synthetic
+    # generation takes that one-time hit here instead of on the first
+    # real request
+    start = time.perf_counter()
+    result = await asyncio.get_running_loop().run_in_executor(
+        _model_executor,
+        functools.partial(
+            run_object_detection,
+            image=Image.new("RGB", (64, 64), "white"),
+            prompt="warmup",
+            max_tokens=4,
+            temperature=0.0,
+        ),
+    )
+    # run_object_detection catches generation errors internally; fail
+    # startup loudly instead of reporting healthy with a dead model path
+    if not result.success:
+        raise RuntimeError(f"Model warmup failed: {result.error_message}")
+    logger.info("Model warmup took %.1fs", time.perf_counter() - start)
+
+    global _batch_worker_task
+    _batch_worker_task = asyncio.create_task(_batch_worker())
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
     return {"message": "Object Detection API is running"}
 
 
+def _hash_upload(file: UploadFile) -> str:
+    """Hash the upload's bytes in chunks and rewind for decoding."""
+    digest = hashlib.blake2b(digest_size=16)
+    while chunk := file.file.read(1 << 20):
+        digest.update(chunk)
+    file.file.seek(0)
+    return digest.hexdigest()
+
+
+def _load_upload_image(file: UploadFile) -> Image.Image:
+    """
+    Validate and decode an uploaded image.
+
+    Decodes straight from the upload's spooled file instead of
+    materializing an extra bytes copy; a single load() both validates
+    and decodes, unlike verify() which would force a second decode
+    downstream.
+
+    Raises:
+        HTTPException: If the upload is not a decodable image
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    # JPEGs (the common case for phone/camera clients) go through
+    # libjpeg-turbo's SIMD decoder when PyTurboJPEG is installed
+    if _turbo_jpeg is not None and file.content_type == "image/jpeg":
+        try:
+            return Image.fromarray(
+                _turbo_jpeg.decode(file.file.read(), pixel_format=TJPF_RGB)
+            )
+        except Exception:
+            file.file.seek(0)  # fall back to Pillow
+
+    try:
+        image = Image.open(file.file)
+        image.load()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+
+    # Qwen2.5-VL expects RGB; convert here so the preprocessor
+    # doesn't have to on the hot path
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    return image
+
+
 @app.post("/objectdetection", response_model=ObjectDetectionResponse)
 async def detect_objects(
     file: UploadFile = File(...),
@@ -73,47 +222,44 @@ async def detect_objects(
         ObjectDetectionResponse: Detection results
     """
     try:
-        # Validate file type
-        if not file.content_type or not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
+        # Duplicate uploads with identical parameters are answered from
+        # the response cache without touching the model
+        cache_key = (
+            _hash_upload(file),
+            request.prompt,
+            request.max_tokens,
+            request.temperature,
+            request.max_pixels,
+        )
+        with _result_cache_lock:
+            cached = _result_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        # Read and validate image
-        image_data = await file.read()
-        try:
-            image = Image.open(io.BytesIO(image_data))
-            image.verify()  # Verify it's a valid image
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+        image = _load_upload_image(file)
 
-        # Save image to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-            tmp_file.write(image_data)
-            temp_image_path = tmp_file.name
+        # Run object detection through the batch worker
+        result = await _submit_detection(
+            image=image,
+            prompt=request.prompt,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            max_pixels=request.max_pixels,
+        )
 
-        try:
-            # Run object detection
-            result = run_object_detection(
-                image=image,
-                prompt=request.prompt,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature,
+        if result.success:
+            response = ObjectDetectionResponse(
+                success=True,
+                objects=result.objects,
+                response_text=result.response_text,
+            )
+            with _result_cache_lock:
+                _result_cache[cache_key] = response
+            return response
+        else:
+            return ObjectDetectionResponse(
+                success=False, error_message=result.error_message
             )
-
-            if result.success:
-                return ObjectDetectionResponse(
-                    success=True,
-                    objects=result.objects,
-                    response_text=result.response_text,
-                )
-            else:
-                return ObjectDetectionResponse(
-                    success=False, error_message=result.error_message
-                )
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_image_path):
-                os.unlink(temp_image_path)
 
     except HTTPException:
         raise
@@ -123,6 +269,69 @@ async def detect_objects(
         )
 
 
+@app.post("/objectdetection/stream")
+async def detect_objects_stream(
+    file: UploadFile = File(...),
+    request: ObjectDetectionRequest = ObjectDetectionRequest(),
+):
+    """
+    Detect objects in an uploaded image, streaming tokens as SSE.
+
+    Tokens are flushed as the model generates them, so time-to-first-byte
+    is prefill-only instead of the full decode time. Callers that need a
+    single parsed JSON blob should use /objectdetection instead.
+
+    Args:
+        file: The image file to analyze
+        request: Object detection parameters
+
+    Returns:
+        StreamingResponse: text/event-stream of {"delta": "..."} events
+    """
+    image = _load_upload_image(file)
+
+    loop = asyncio.get_running_loop()
+    chunk_queue: asyncio.Queue = asyncio.Queue()
+
+    def _produce():
+        # Runs on _model_executor so streaming requests share the same
+        # single caller on the Metal device as the batch worker instead
+        # of generating concurrently with it. Errors are forwarded
+        # through the queue so the consumer never has to await this
+        # future (awaiting it in the generator's finally would break
+        # GeneratorExit handling on client disconnect).
+        try:
+            for delta in stream_object_detection(
+                image=image,
+                prompt=request.prompt,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                max_pixels=request.max_pixels,
+            ):
+                loop.call_soon_threadsafe(chunk_queue.put_nowait, delta)
+        except Exception as e:
+            logger.error("Error during streamed generation: %s", e)
+            loop.call_soon_threadsafe(chunk_queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(chunk_queue.put_nowait, None)
+
+    async def event_stream():
+        loop.run_in_executor(_model_executor, _produce)
+        while True:
+            delta = await chunk_queue.get()
+            if delta is None:
+                break
+            if isinstance(delta, Exception):
+                # Tell the client this is a failure, not an empty result;
+                # the sentinel from the producer's finally ends the loop
+                yield b"data: " + orjson.dumps({"error": str(delta)}) + b"\n\n"
+                continue
+            yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
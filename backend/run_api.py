@@ -3,9 +3,25 @@
 Script to run the FastAPI object detection API.
 """
 
+import os
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "api.main:app", host="0.0.0.0", port=8000, reload=True, log_level="info"
-    )
+    if os.getenv("DEV"):
+        # Auto-reload for local development; the filewatcher disables
+        # uvloop and forces a single worker
+        uvicorn.run(
+            "api.main:app", host="0.0.0.0", port=8000, reload=True, log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "api.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=False,
+            workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+            loop="uvloop",
+            http="httptools",
+            log_level="warning",
+        )